@@ -1,12 +1,16 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Iterable, Optional
-import argparse
+from typing import IO, TYPE_CHECKING, Iterable, Optional
 import fnmatch
+import functools
 import os
-import pyperclip  # type: ignore
+import pathlib
+import re
 import shutil
+import sys
+import tempfile
+
+if TYPE_CHECKING:
+    import argparse
 
 """
 A simple tool for AWS profiles management
@@ -22,10 +26,11 @@ DESCRIPTION = 'A simple tool to manage your AWS credentials'
 
 # Env variable init to reference the credentials file
 DEFAULT_CREDS_LOCATION = os.path.join(os.path.expanduser('~'), '.aws', 'credentials')
-if 'AWS_CREDS_FILE' not in os.environ\
-        or not os.path.isdir(os.path.dirname(os.environ['AWS_CREDS_FILE'])):
-    # Replace the variable value in the contex of the current process
-    os.environ['AWS_CREDS_FILE'] = DEFAULT_CREDS_LOCATION
+AWS_CREDS_FILE = os.path.expanduser(os.environ.get('AWS_CREDS_FILE', ''))
+if not AWS_CREDS_FILE or not os.path.isdir(os.path.dirname(AWS_CREDS_FILE)):
+    AWS_CREDS_FILE = DEFAULT_CREDS_LOCATION
+# Replace the variable value in the contex of the current process
+os.environ['AWS_CREDS_FILE'] = AWS_CREDS_FILE
 
 
 class ProfileError(Exception):
@@ -36,41 +41,83 @@ class ProfileError(Exception):
         super().__init__(self.message)
 
 
-@dataclass
 class AWSProfile:
     """
     Represents a single aws profile comprised of several tokens.
     Supported methods:
         dump(): to easily save the profile in a text file.
+        emit(): writes the dumped profile straight into an open text file
         copy(): yields new profile with similar tokens, used to avoid
                 multiple variables binding to a single profile
     All fields except name are optional since profile might be built gradually,
     i.e. not all the values determinet at the init time
+    Keys are left out of repr() and equality checks to keep secrets out of logs
     """
-    profile_name: str
-    aws_access_key_id: Optional[str] = field(default=None, repr=False, compare=False)
-    aws_secret_access_key: Optional[str] = field(default=None, repr=False, compare=False)
-    aws_session_token: Optional[str] = ""
+    __slots__ = ('profile_name', 'aws_access_key_id', 'aws_secret_access_key', 'aws_session_token')
+
+    def __init__(self, profile_name: str,
+                 aws_access_key_id: Optional[str] = None,
+                 aws_secret_access_key: Optional[str] = None,
+                 aws_session_token: Optional[str] = "") -> None:
+        self.profile_name = profile_name
+        self.aws_access_key_id = aws_access_key_id
+        self.aws_secret_access_key = aws_secret_access_key
+        self.aws_session_token = aws_session_token
+
+    def __repr__(self) -> str:
+        return f'AWSProfile(profile_name={self.profile_name!r}, aws_session_token={self.aws_session_token!r})'
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, AWSProfile):
+            return NotImplemented
+        return (self.profile_name, self.aws_session_token) == (other.profile_name, other.aws_session_token)
 
     def dump(self) -> str:
-        fields = []
-        for f in self.__dataclass_fields__.values():
-            name = f.name
-            value = getattr(self, name)
-            if value:
-                if name == 'profile_name':
-                    fields.append(f"[{value}]")
-                else:
-                    fields.append(f"{name}={value}")
+        fields = [f"[{self.profile_name}]"]
+        if self.aws_access_key_id:
+            fields.append(f"aws_access_key_id={self.aws_access_key_id}")
+        if self.aws_secret_access_key:
+            fields.append(f"aws_secret_access_key={self.aws_secret_access_key}")
+        if self.aws_session_token:
+            fields.append(f"aws_session_token={self.aws_session_token}")
         return "\n".join(fields)
 
+    def emit(self, out: IO[str]) -> None:
+        out.write(f"[{self.profile_name}]\n")
+        if self.aws_access_key_id:
+            out.write(f"aws_access_key_id={self.aws_access_key_id}\n")
+        if self.aws_secret_access_key:
+            out.write(f"aws_secret_access_key={self.aws_secret_access_key}\n")
+        if self.aws_session_token:
+            out.write(f"aws_session_token={self.aws_session_token}\n")
+
     def copy(self) -> AWSProfile:
-        return AWSProfile(
-            self.profile_name,
-            self.aws_access_key_id,
-            self.aws_secret_access_key,
-            self.aws_session_token
-        )
+        # Plain slot assignment, no need to go through __init__ for a clone
+        new = AWSProfile.__new__(AWSProfile)
+        new.profile_name = self.profile_name
+        new.aws_access_key_id = self.aws_access_key_id
+        new.aws_secret_access_key = self.aws_secret_access_key
+        new.aws_session_token = self.aws_session_token
+        return new
+
+
+# Accepted spellings of the profile sources for inject_profile_from()
+_CB_ALIASES = frozenset({'cb', 'clipboard'})
+_ENV_ALIASES = frozenset({'env', 'environment'})
+_STDIN_ALIASES = frozenset({'stdin', '-'})
+
+# Section header line, i.e. a profile name in brackets
+_SECTION_RE = re.compile(rb'^[ \t]*\[(.+)\][ \t]*\r?$', re.MULTILINE)
+
+# Parsed profiles keyed by the absolute credentials file path, stored along with
+# (st_mtime_ns, st_size) of the file at parse time to detect outside changes
+_PROFILE_CACHE: dict[str, tuple[int, int, dict[str, AWSProfile]]] = {}
+
+
+def _format_profiles_list(creds_file: str, profile_names: Iterable[str]) -> str:
+    header = f'AWS profiles in {creds_file}\n'
+    profs_list = '- ' + '\n- '.join(profile_names)
+    return f'{header}{profs_list}'
 
 
 class AWSCredentials():
@@ -86,8 +133,10 @@ class AWSCredentials():
 
         inject_profile: adds new AWSProfile to the self.profiles
 
-        inject_profile_from: adds profile from the clipboard or from a set of
-                             environment variables
+        inject_profiles: adds several AWSProfiles at once
+
+        inject_profile_from: adds profile from the clipboard, from a set of
+                             environment variables or every profile from stdin
 
         delete_profile: remove given profile from self.profiles
 
@@ -97,75 +146,143 @@ class AWSCredentials():
 
         save: saves profiles to AWS_CREDS_FILE location, replacing its contents
 
-        backup: create a backup copy of current AWS_CREDS_FILE in the specified location
+        backup: create a copy of the AWS_CREDS_FILE as it is on disk in the specified location
+
+        invalidate_cache: drop all parsed credentials files from the module-level cache
     """
 
-    def __init__(self, creds_file: str = os.environ['AWS_CREDS_FILE']) -> None:
+    def __init__(self, creds_file: str = AWS_CREDS_FILE) -> None:
         self.creds_file = creds_file
-        self.profiles = self._get_profiles_from_creds_file()
+        if not os.path.exists(self.creds_file):
+            with open(self.creds_file, 'w', encoding='utf-8'):
+                pass
+        # Parsed on first access, backup() and restore() only need the file itself
+        self._loaded_profiles: Optional[dict[str, AWSProfile]] = None
+        self._dirty = False
 
     def __contains__(self, item: str) -> bool:
-        return item in self.profiles
+        return item in self._profiles
 
     def __getitem__(self, item: str) -> AWSProfile:
-        return self.profiles[item]
+        # Callers may modify the returned profile, so it must not be the cached one
+        return self._own_profiles()[item]
 
     def __len__(self) -> int:
-        return len(self.profiles)
-
-    def _build_profile(self, profile_txt: Iterable[str]) -> AWSProfile:
-        for line in profile_txt:
-            if line.startswith('[') and line.endswith(']'):  # found another profile
-                profile_name = line.strip('[]')
-                # Build new profile object
-                current_profile = AWSProfile(profile_name=profile_name)
-            else:
-                sep = line.find('=')
-                field_name, field_value = line[:sep].strip(), line[sep + 1:].strip()
-                if 'current_profile' not in locals():
-                    raise ValueError(
-                        f'Found {field_name} outside of profile definition')
-                setattr(current_profile, field_name, field_value)
-        return current_profile
+        return len(self._profiles)
+
+    @property
+    def _profiles(self) -> dict[str, AWSProfile]:
+        """Shared with the parse cache until the first mutation, see _own_profiles()"""
+        if self._loaded_profiles is None:
+            self._loaded_profiles = self._get_profiles_from_creds_file()
+        return self._loaded_profiles
+
+    @_profiles.setter
+    def _profiles(self, profiles: dict[str, AWSProfile]) -> None:
+        self._loaded_profiles = profiles
+
+    @property
+    def profiles(self) -> dict[str, AWSProfile]:
+        # Public and mutable, detach from the cache first. Internal read-only
+        # paths use self._profiles directly
+        return self._own_profiles()
+
+    @profiles.setter
+    def profiles(self, profiles: dict[str, AWSProfile]) -> None:
+        self._profiles = profiles
+        self._dirty = True
+
+    def _own_profiles(self) -> dict[str, AWSProfile]:
+        """Detach from the cached profiles before the first mutation (copy-on-write)"""
+        if not self._dirty:
+            self._profiles = {name: p.copy() for name, p in self._profiles.items()}
+            self._dirty = True
+        return self._profiles
+
+    @staticmethod
+    def list_names(creds_file: str) -> list[str]:
+        """Profile names in the credentials file, found without parsing the profiles themselves"""
+        if not os.path.exists(creds_file):
+            return []
+        # Scan raw bytes, only the matched names need decoding
+        data = pathlib.Path(creds_file).read_bytes()
+        # Repeated sections are merged into one profile by the parser
+        return [name.decode('utf-8') for name in dict.fromkeys(_SECTION_RE.findall(data))]
+
+    @staticmethod
+    def invalidate_cache() -> None:
+        """Forget all previously parsed credentials files"""
+        _PROFILE_CACHE.clear()
+
+    def _cache_key(self) -> str:
+        return os.path.abspath(self.creds_file)
+
+    def _parse_profiles(self, lines: Iterable[str]) -> dict[str, AWSProfile]:
+        """Single pass over the lines, every key/value goes straight into its profile"""
+        profiles: dict[str, AWSProfile] = {}
+        current_profile: Optional[AWSProfile] = None
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] in '#;':  # blank line or comment
+                continue
+            if line[0] == '[' and line[-1] == ']':  # found another profile
+                profile_name = line[1:-1]
+                # Repeated sections are merged, the later values win
+                current_profile = profiles.get(profile_name)
+                if current_profile is None:
+                    current_profile = profiles[profile_name] = AWSProfile(profile_name=profile_name)
+                continue
+            field_name, eq, field_value = line.partition('=')
+            field_name = field_name.strip()
+            if current_profile is None:
+                raise ValueError(f'Found {field_name} outside of profile definition')
+            if not eq:
+                raise ValueError(f'Malformed line in profile {current_profile.profile_name}')
+            # Direct slot stores, unknown keys are dropped
+            if field_name == 'aws_access_key_id':
+                current_profile.aws_access_key_id = field_value.strip()
+            elif field_name == 'aws_secret_access_key':
+                current_profile.aws_secret_access_key = field_value.strip()
+            elif field_name == 'aws_session_token':
+                current_profile.aws_session_token = field_value.strip()
+        return profiles
 
     def _get_profiles_from_creds_file(self) -> dict[str, AWSProfile]:
 
         if not os.path.exists(self.creds_file):
-            with open(self.creds_file, 'w', encoding='utf-8'):
-                return dict()
+            return dict()
 
-        existing_profiles: dict[str, AWSProfile] = {}
-        current_profile: Optional[AWSProfile] = None
+        stat = os.stat(self.creds_file)
+        cached = _PROFILE_CACHE.get(self._cache_key())
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        existing_profiles = self._parse_creds_file()
+        _PROFILE_CACHE[self._cache_key()] = (stat.st_mtime_ns, stat.st_size, existing_profiles)
+        return existing_profiles
 
-        with open(self.creds_file, 'r', encoding='utf-8') as f:
-            collected_lines: list[str] = []
-            for raw in f:
-                line = raw.strip()
-                if len(line) > 0:
-                    if line.startswith('[') and line.endswith(']'):
-                        if len(collected_lines) > 0:
-                            current_profile = self._build_profile(collected_lines)
-                            existing_profiles[current_profile.profile_name] = current_profile
-                            collected_lines.clear()
-                        collected_lines.append(line)
-                    else:
-                        collected_lines.append(line)
-
-            if len(collected_lines) == 0:
-                return dict()
-
-            # Last profile
-            current_profile = self._build_profile(collected_lines)
-            existing_profiles[current_profile.profile_name] = current_profile
-            return existing_profiles
+    def _parse_creds_file(self) -> dict[str, AWSProfile]:
+        # The file is tiny, a single read beats iterating it line by line
+        text = pathlib.Path(self.creds_file).read_bytes().decode('utf-8')
+        return self._parse_profiles(text.splitlines())
 
     def _get_profile_from_clipboard(self) -> AWSProfile:
+        # pyperclip drags in subprocess and ctypes, only pay for it when actually needed
+        import pyperclip  # type: ignore
         clipboard_text = pyperclip.paste()
         if 'aws_access_key_id' not in clipboard_text:
             raise ValueError('AWS Access Key is not in the clipboard')
-        lines = map(lambda x: x.strip('\r\n'), clipboard_text.split('\n'))
-        prof = self._build_profile(lines)
-        return prof
+        profiles = self._parse_profiles(clipboard_text.splitlines())
+        if not profiles:
+            raise ValueError('No profile definition found in the clipboard')
+        # The last profile wins if several were copied at once
+        return list(profiles.values())[-1]
+
+    def _get_profiles_from_stdin(self) -> dict[str, AWSProfile]:
+        profiles = self._parse_profiles(sys.stdin.read().splitlines())
+        if not profiles:
+            raise ValueError('No profile definition found in the standard input')
+        return profiles
 
     def _get_profile_from_env(self) -> AWSProfile:
         profile_name = 'env_profile'
@@ -187,68 +304,113 @@ class AWSCredentials():
         if profile_name.lower() == 'default':
             raise ProfileError('Specified profile is already a default')
         try:
-            new_default = self.profiles[profile_name].copy()
+            new_default = self._profiles[profile_name].copy()
             new_default.profile_name = 'default'
-            self.profiles['default'] = new_default
+            self._own_profiles()['default'] = new_default
         except KeyError:
             raise ProfileError(f'Profile {profile_name} does not exist')
         return profile_name
 
     def inject_profile(self, profile: AWSProfile, setdefault: bool = False, strict: bool = False) -> None:
-        if strict and profile.profile_name in self.profiles:
+        if strict and profile.profile_name in self._profiles:
             raise ProfileError(f'Profile {profile} already exists and strict mode specified')
         else:
-            self.profiles[profile.profile_name] = profile
+            self._own_profiles()[profile.profile_name] = profile
         if setdefault:
             self.setdefault(profile.profile_name)
 
+    def inject_profiles(self, profiles: Iterable[AWSProfile], strict: bool = False) -> list[str]:
+        """Add several profiles at once, so they are written with a single save()"""
+        profiles = list(profiles)
+        if strict:
+            # Check the whole batch upfront, so a clash does not leave it half injected
+            seen: set[str] = set()
+            for profile in profiles:
+                if profile.profile_name in self._profiles or profile.profile_name in seen:
+                    raise ProfileError(f'Profile {profile} already exists and strict mode specified')
+                seen.add(profile.profile_name)
+        names = []
+        for profile in profiles:
+            self.inject_profile(profile)
+            names.append(profile.profile_name)
+        return names
+
     def inject_profile_from(self, source: str,
                             setdefault: bool = False,
                             strict: bool = False,
                             rename_to: Optional[str] = None) -> str:
-        if source.lower() in ('cb', 'clipboard'):
-            new_profile = self._get_profile_from_clipboard()
-        elif source.lower() in ('env', 'environment'):
-            new_profile = self._get_profile_from_env()
+        source = source.lower()
+        if source in _CB_ALIASES:
+            new_profiles = [self._get_profile_from_clipboard()]
+        elif source in _ENV_ALIASES:
+            new_profiles = [self._get_profile_from_env()]
+        elif source in _STDIN_ALIASES:
+            new_profiles = list(self._get_profiles_from_stdin().values())
+        else:
+            raise ProfileError('Unknown profile source')
+        if len(new_profiles) > 1 and (setdefault or rename_to):
+            raise ProfileError('Only a single new profile can be renamed or set as default')
         if rename_to:
-            new_profile.profile_name = rename_to
-        self.inject_profile(new_profile, setdefault=setdefault, strict=strict)
-        return new_profile.profile_name
+            new_profiles[0].profile_name = rename_to
+        names = self.inject_profiles(new_profiles, strict=strict)
+        if setdefault:
+            self.setdefault(names[0])
+        return ', '.join(names)
 
     def delete_profile(self, profile_name: str) -> str:
         try:
-            del (self.profiles[profile_name])
+            del (self._own_profiles()[profile_name])
         except KeyError:
             raise ProfileError(f'Profile {profile_name} does not exist')
         return profile_name
 
     def list(self) -> str:
         """List all profiles in the credentials file"""
-        header = f'AWS profiles in {self.creds_file}\n'
-        profs_list = '- ' + '\n- '.join(list(self.profiles.keys()))
-        return f'{header}{profs_list}'
+        return _format_profiles_list(self.creds_file, self._profiles)
 
     def show(self, profile_name: str) -> str:
         """Show details of particular profile from the credentials file"""
         try:
-            return self.profiles[profile_name].dump()
+            return self._profiles[profile_name].dump()
         except KeyError:
             raise ProfileError(f'Profile {profile_name} does not exist')
 
     def save(self, target_path: Optional[str] = None) -> None:
         if not target_path:
             target_path = self.creds_file
-        with open(target_path, 'w', encoding='utf-8') as f:
-            for p in self.profiles.values():
-                f.writelines(p.dump())
-                f.write('\n')
-            f.write('\n')
+        cache_key = os.path.abspath(target_path)
+        # Follow symlinks (e.g. dotfile managers), so the real file gets updated
+        target_path = os.path.realpath(target_path)
+        # Write next to the target and swap it in, so readers never see a half-written file
+        target_dir, target_name = os.path.split(target_path)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=target_dir,
+                                         prefix=f'.{target_name}.', suffix='.tmp', delete=False) as f:
+            try:
+                # Profiles go straight into the file buffer, separated by a blank line
+                for i, p in enumerate(self._profiles.values()):
+                    if i:
+                        f.write('\n')
+                    p.emit(f)
+                f.flush()
+                os.fsync(f.fileno())
+                if os.path.exists(target_path):
+                    shutil.copymode(target_path, f.name)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, target_path)
+        # mtime resolution may be too coarse to notice a quick rewrite
+        _PROFILE_CACHE.pop(cache_key, None)
+        _PROFILE_CACHE.pop(target_path, None)
 
     def backup(self, target_path: Optional[str] = None) -> str:
         if not target_path:
+            from datetime import datetime
             dt = datetime.now().strftime('%Y-%m-%d-%H%M%S')
             target_path = f'{self.creds_file}-{dt}.bkp'
-        self.save(target_path=target_path)
+        # Byte-for-byte copy of the file on disk, lets the OS copy it in kernel space
+        shutil.copy2(self.creds_file, target_path)
         return target_path
 
     def restore(self, latest: bool = True, backup_path: Optional[str] = None) -> str:
@@ -273,12 +435,13 @@ class AWSCredentials():
         else:
             raise ValueError('Neither --latest option, nor backup location specified')
         shutil.copy(backup_file, self.creds_file)
+        _PROFILE_CACHE.pop(self._cache_key(), None)
         return backup_file
 
     def rename(self, from_: str, to_: str) -> str:
         if from_ != to_:
             try:
-                tmp_profile = self.profiles[from_]
+                tmp_profile = self._own_profiles()[from_]
                 tmp_profile.profile_name = to_
                 self.inject_profile(tmp_profile, strict=True)
                 self.delete_profile(from_)
@@ -292,116 +455,168 @@ class AWSCredentials():
         return self.list()
 
 
-def main() -> int:
+# Every subcommand name and alias accepted by the CLI
+_COMMANDS = frozenset({
+    'add', 'list', 'ls', 'backup', 'bckp', 'restore', 'delete', 'del', 'setdefault', 'setdef',
+    'show', 'showfile', 'file', 'rename', 'version', 'ver', 'v',
+})
+
+
+def _requested_command(argv: list[str]) -> Optional[str]:
+    """Guess the subcommand from raw arguments, None if it is not a known one"""
+    args = iter(argv)
+    for arg in args:
+        if arg == '-h' or (len(arg) > 2 and '--help'.startswith(arg)):
+            return None  # top-level help lists every command
+        if len(arg) > 2 and '--creds_file'.startswith(arg):
+            next(args, None)  # skip the option value, argparse accepts any unambiguous prefix
+        elif not arg.startswith('-'):
+            return arg if arg in _COMMANDS else None
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _build_parser(command: Optional[str]) -> argparse.ArgumentParser:
+    """
+    Build the CLI parser with the subparser of the given command only,
+    None builds the full tree needed for help and error messages.
+    Cached, so repeated main() calls in one process reuse the parser
+    """
+    import argparse
+
+    def wanted(*names: str) -> bool:
+        return command is None or command in names
+
     # Create the parser
     parser = argparse.ArgumentParser(
         description=DESCRIPTION)
     parser.add_argument('--creds_file', type=str,
-                        required=False, default=os.environ['AWS_CREDS_FILE'],
+                        required=False, default=AWS_CREDS_FILE,
                         help='Override credentials file location')
 
     # Add the subcommands
     subparsers = parser.add_subparsers(dest='command')
 
     # Add the "add" subcommand
-    add_parser = subparsers.add_parser('add', help='Add new profile')
-    add_parser.add_argument(
-        'source', type=str, help='Where to look for the new profile (cb = clipboard)')
-    add_parser.add_argument('--setdefault', action='store_true',
-                            help='Save the added profile as default')
-    add_parser.add_argument('--rename_to', type=str, default=None,
-                            help='Rename new profile')
+    if wanted('add'):
+        add_parser = subparsers.add_parser('add', help='Add new profile')
+        add_parser.add_argument(
+            'source', type=str,
+            help='Where to look for the new profile (cb = clipboard, env = environment, '
+                 'stdin = every profile piped to standard input)')
+        add_parser.add_argument('--setdefault', action='store_true',
+                                help='Save the added profile as default')
+        add_parser.add_argument('--rename_to', type=str, default=None,
+                                help='Rename new profile')
 
     # Add "list" command
-    list_parser = subparsers.add_parser(  # noqa: F841
-        'list', aliases=['ls',], help='Show existing profiles')
+    if wanted('list', 'ls'):
+        list_parser = subparsers.add_parser(  # noqa: F841
+            'list', aliases=['ls',], help='Show existing profiles')
 
     # Add "backup" command
-    backup_parser = subparsers.add_parser(
-        'backup', aliases=['bckp'], help='Backup existing profiles')
-    backup_parser.add_argument('--dest', type=str, default=None)
+    if wanted('backup', 'bckp'):
+        backup_parser = subparsers.add_parser(
+            'backup', aliases=['bckp'], help='Backup existing profiles')
+        backup_parser.add_argument('--dest', type=str, default=None)
 
     # Add "restore" command
-    restore_parser = subparsers.add_parser(
-        'restore', help='Restore the latest backup of credentials file')
-    restore_parser.add_argument(
-        '--latest', action='store_true', help='Whether to restore the latest backup')
-    restore_parser.add_argument('--dest', type=str, default=None)
+    if wanted('restore'):
+        restore_parser = subparsers.add_parser(
+            'restore', help='Restore the latest backup of credentials file')
+        restore_parser.add_argument(
+            '--latest', action='store_true', help='Whether to restore the latest backup')
+        restore_parser.add_argument('--dest', type=str, default=None)
 
     # Add "delete" command
-    delete_parser = subparsers.add_parser(
-        'delete', aliases=['del'], help='Backup existing profiles')
-    delete_parser.add_argument('profile', type=str,
-                               help='Delete profile by name')
+    if wanted('delete', 'del'):
+        delete_parser = subparsers.add_parser(
+            'delete', aliases=['del'], help='Backup existing profiles')
+        delete_parser.add_argument('profile', type=str,
+                                   help='Delete profile by name')
 
     # Add "setdefault" command
-    setdefault_parser = subparsers.add_parser(
-        'setdefault', aliases=['setdef'], help='Set given profile as default')
-    setdefault_parser.add_argument('profile', type=str,
-                                   help='Profile name to make default')
+    if wanted('setdefault', 'setdef'):
+        setdefault_parser = subparsers.add_parser(
+            'setdefault', aliases=['setdef'], help='Set given profile as default')
+        setdefault_parser.add_argument('profile', type=str,
+                                       help='Profile name to make default')
 
     # Add "show" command
-    show_parser = subparsers.add_parser(
-        'show', help='Show full profile info')
-    show_parser.add_argument('profile', type=str,
-                             help='Profile name to show')
+    if wanted('show'):
+        show_parser = subparsers.add_parser(
+            'show', help='Show full profile info')
+        show_parser.add_argument('profile', type=str,
+                                 help='Profile name to show')
 
     # Add "showfile" command
-    showfile_parser = subparsers.add_parser(  # noqa: F841
-        'showfile', aliases=['file',], help='Show current credentials file')
+    if wanted('showfile', 'file'):
+        showfile_parser = subparsers.add_parser(  # noqa: F841
+            'showfile', aliases=['file',], help='Show current credentials file')
 
     # Add "rename" command
-    rename_parser = subparsers.add_parser('rename', help='rename a profile')
-    rename_parser.add_argument('from_', type=str, help='Source profile name')
-    rename_parser.add_argument('to_', type=str, help='Target profile name')
+    if wanted('rename'):
+        rename_parser = subparsers.add_parser('rename', help='rename a profile')
+        rename_parser.add_argument('from_', type=str, help='Source profile name')
+        rename_parser.add_argument('to_', type=str, help='Target profile name')
 
     # Add "version" command
-    version_parser = subparsers.add_parser('version', aliases=['ver', 'v'],   # noqa: F841
-                                           help='Show current version and exit')
+    if wanted('version', 'ver', 'v'):
+        version_parser = subparsers.add_parser('version', aliases=['ver', 'v'],   # noqa: F841
+                                               help='Show current version and exit')
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
 
     # Parse the arguments and call the appropriate methods
-    args = parser.parse_args()
-    local_profiles = AWSCredentials(args.creds_file)
+    args = _build_parser(_requested_command(argv)).parse_args(argv)
+    # Only the commands that work with profiles pay for reading the credentials file
     try:
         if args.command == 'add':
-            try:
-                sources_map = {'cb': 'cb', 'clipboard': 'cb', 'env': 'env', 'environment': 'env'}
-                source = sources_map[args.source.lower()]
-                new_profile = local_profiles.inject_profile_from(
-                    source=source, setdefault=args.setdefault, rename_to=args.rename_to)
-            except KeyError:
-                raise ProfileError('Unknown profile source')
+            local_profiles = AWSCredentials(args.creds_file)
+            new_profile = local_profiles.inject_profile_from(
+                source=args.source, setdefault=args.setdefault, rename_to=args.rename_to)
             local_profiles.save()
             print(f'Added new profile: {new_profile}')
 
         elif args.command in ('list', 'ls'):
-            print(local_profiles.list())
+            print(_format_profiles_list(args.creds_file, AWSCredentials.list_names(args.creds_file)))
 
         elif args.command in ('backup', 'bckp'):
+            local_profiles = AWSCredentials(args.creds_file)
             backup_path = local_profiles.backup(args.dest)
             print(f'AWS profiles backed up to: {backup_path}')
 
-        elif args.command in ('restore'):  # not implemented
+        elif args.command == 'restore':
+            local_profiles = AWSCredentials(args.creds_file)
             restored_from = local_profiles.restore(latest=args.latest, backup_path=args.dest)
             print(f'AWS profiles restored from: {restored_from}')
 
         elif args.command in ('delete', 'del'):
+            local_profiles = AWSCredentials(args.creds_file)
             deleted_profile = local_profiles.delete_profile(args.profile)
             local_profiles.save()
             print(f'Deleted profile: {deleted_profile}')
 
         elif args.command in ('setdefault', 'setdef'):
+            local_profiles = AWSCredentials(args.creds_file)
             default_prof = local_profiles.setdefault(args.profile)
             local_profiles.save()
             print(f'{default_prof} is set as default')
 
-        elif args.command in ('show'):
+        elif args.command == 'show':
+            local_profiles = AWSCredentials(args.creds_file)
             print(local_profiles.show(args.profile))
 
         elif args.command in ('showfile', 'file'):
-            print(local_profiles.creds_file)
+            print(args.creds_file)
 
-        elif args.command in ('rename'):
+        elif args.command == 'rename':
+            local_profiles = AWSCredentials(args.creds_file)
             result = local_profiles.rename(args.from_, args.to_)
             local_profiles.save()
             print(f'Renamed: {result}')
@@ -412,6 +627,9 @@ def main() -> int:
     except ProfileError as e:
         print(e.message)
         return 1
+    except ValueError as e:  # malformed credentials file or profile source
+        print(e)
+        return 1
 
     return 0
 